@@ -1,8 +1,11 @@
-from typing import Any, List, Dict, Tuple, Optional, Union
-import json
+from typing import Any, List, Dict, Tuple, Optional
+import threading
 import time
-from datetime import datetime
-from urllib.parse import urlencode
+from queue import Empty, Full, Queue
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from app.core.event import eventmanager, Event
 from app.log import logger
@@ -10,6 +13,34 @@ from app.plugins import _PluginBase
 from app.schemas.types import EventType, NotificationType
 from app.utils.http import RequestUtils
 
+# 插件停止后继续发送已排队消息的最长时间（秒），超时后丢弃剩余消息
+_DRAIN_TIMEOUT = 30
+
+# NotificationType 名称及取值到枚举的映射，避免每条消息都遍历枚举；与逐个比较一致，先定义的枚举优先
+_NOTIFICATION_TYPES: Dict[str, NotificationType] = {}
+for _item in NotificationType:
+    _NOTIFICATION_TYPES.setdefault(_item.name, _item)
+    _NOTIFICATION_TYPES.setdefault(_item.value, _item)
+del _item
+
+# 配置页面的下拉选项，只在导入时构建一次
+_MSG_TYPE_OPTIONS: List[Dict[str, str]] = [
+    {
+        "title": item.value,
+        "value": item.name
+    } for item in NotificationType
+]
+_MESSAGE_TYPE_OPTIONS: List[Dict[str, str]] = [
+    {
+        "title": "私聊消息",
+        "value": "private"
+    },
+    {
+        "title": "群组消息",
+        "value": "group"
+    }
+]
+
 
 class OneBotMsg(_PluginBase):
     # 插件名称
@@ -19,7 +50,7 @@ class OneBotMsg(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/YunFeng86/MoviePilot-Plugins/main/icons/OneBot_A.png"
     # 插件版本
-    plugin_version = "1.0.0"
+    plugin_version = "1.1.0"
     # 插件作者
     plugin_author = "YunFeng"
     # 作者主页
@@ -39,6 +70,19 @@ class OneBotMsg(_PluginBase):
     _group_id = None
     _message_type = None
     _msgtypes = []
+    # 后台发送队列、线程及停止信号
+    _queue: Optional[Queue] = None
+    _worker: Optional[threading.Thread] = None
+    _stop_event: Optional[threading.Event] = None
+    # 停止后仍在发送已排队消息的上一个发送线程
+    _draining_worker: Optional[threading.Thread] = None
+    # 保护发送线程启停、消息入队及会话创建、关闭
+    _lock = threading.Lock()
+    # 复用的HTTP会话，保持与OneBot服务的长连接
+    _session: Optional[requests.Session] = None
+    # 请求头及发送目标（接口地址、目标参数、配置错误），只随配置变化
+    _headers: Dict[str, str] = {}
+    _target: Tuple[Optional[str], Optional[Dict[str, int]], Optional[str]] = (None, None, "服务器地址未配置")
 
     def init_plugin(self, config: Optional[dict] = None):
         if config:
@@ -50,6 +94,14 @@ class OneBotMsg(_PluginBase):
             self._group_id = config.get("group_id")
             self._message_type = config.get("message_type")
 
+        # 请求头和发送目标在配置加载时构建一次，发送时直接复用
+        self._headers = {"Authorization": f"Bearer {self._access_token}"} if self._access_token else {}
+        self._target = self._resolve_target()
+
+        # 启动后台发送线程
+        if self._enabled:
+            self._start_worker()
+
         # 发送测试消息（如果是通过修改配置启用的）
         if config and config.get("onlyonce"):
             self._send("OneBot消息测试通知", "OneBot消息通知插件已启用")
@@ -89,25 +141,6 @@ class OneBotMsg(_PluginBase):
         """
         拼装插件配置页面，需要返回两块数据：1、页面配置；2、数据结构
         """
-        # 编历 NotificationType 枚举，生成消息类型选项
-        msg_type_options = []
-        for item in NotificationType:
-            msg_type_options.append({
-                "title": item.value,
-                "value": item.name
-            })
-        
-        message_type_options = [
-            {
-                "title": "私聊消息",
-                "value": "private"
-            },
-            {
-                "title": "群组消息",
-                "value": "group"
-            }
-        ]
-        
         return [
             {
                 'component': 'VForm',
@@ -203,7 +236,7 @@ class OneBotMsg(_PluginBase):
                                         'props': {
                                             'model': 'message_type',
                                             'label': '消息类型',
-                                            'items': message_type_options
+                                            'items': _MESSAGE_TYPE_OPTIONS
                                         }
                                     }
                                 ]
@@ -260,7 +293,7 @@ class OneBotMsg(_PluginBase):
                                             'chips': True,
                                             'model': 'msgtypes',
                                             'label': '消息类型',
-                                            'items': msg_type_options
+                                            'items': _MSG_TYPE_OPTIONS
                                         }
                                     }
                                 ]
@@ -279,11 +312,14 @@ class OneBotMsg(_PluginBase):
             'message_type': 'private',
         }
 
-    def get_page(self) -> Optional[List[dict]]:
-        """拼装插件详情页面，显示OneBot状态"""
-        # 获取状态信息
-        enabled_status = "已启用" if self.get_state() else "未启用"
-        status_color = "success" if self.get_state() else "error"
+    def _get_status_texts(self) -> Tuple[str, str, str, str, str]:
+        """
+        计算详情页和仪表盘共用的状态文本，只检查一次插件状态
+        :return: 启用状态、状态颜色、服务器、消息类型、目标ID
+        """
+        state = self.get_state()
+        enabled_status = "已启用" if state else "未启用"
+        status_color = "success" if state else "error"
         
         # 服务器状态
         server_status = self._server if self._server else "未配置"
@@ -293,6 +329,13 @@ class OneBotMsg(_PluginBase):
         target_id = self._user_id if self._message_type == "private" else self._group_id
         target_id_text = target_id if target_id else "未配置"
         
+        return enabled_status, status_color, server_status, message_type_text, target_id_text
+
+    def get_page(self) -> Optional[List[dict]]:
+        """拼装插件详情页面，显示OneBot状态"""
+        # 获取状态信息
+        enabled_status, status_color, server_status, message_type_text, target_id_text = self._get_status_texts()
+        
         # 允许的消息类型
         allowed_types = []
         for msg_type in NotificationType:
@@ -495,19 +538,7 @@ class OneBotMsg(_PluginBase):
         }
         
         # 构建状态信息
-        status_items = []
-        
-        # 基本状态
-        enabled_status = "已启用" if self.get_state() else "未启用"
-        status_color = "success" if self.get_state() else "error"
-        
-        # 服务器状态
-        server_status = self._server if self._server else "未配置"
-        
-        # 消息类型
-        message_type_text = "私聊消息" if self._message_type == "private" else "群组消息"
-        target_id = self._user_id if self._message_type == "private" else self._group_id
-        target_id_text = target_id if target_id else "未配置"
+        enabled_status, status_color, server_status, message_type_text, target_id_text = self._get_status_texts()
         
         # 允许的消息类型
         allowed_types = []
@@ -663,55 +694,145 @@ class OneBotMsg(_PluginBase):
         
 
 
+    def _start_worker(self):
+        """启动后台发送线程，避免OneBot服务响应缓慢时阻塞事件处理"""
+        with self._lock:
+            if self._worker and self._worker.is_alive() and not self._stop_event.is_set():
+                return
+            # 上一个发送线程仍在发送已排队的消息时，新线程等待其结束，保证消息顺序
+            previous = self._draining_worker
+            if previous and not previous.is_alive():
+                previous = None
+            self._draining_worker = None
+            self._stop_event = threading.Event()
+            # 队列有上限，OneBot服务长时间不可用时不会无限堆积消息
+            self._queue = Queue(maxsize=32)
+            self._worker = threading.Thread(target=self._worker_loop,
+                                            args=(self._queue, self._stop_event, previous),
+                                            name="OneBotMsg-Sender",
+                                            daemon=True)
+            self._worker.start()
+
+    @staticmethod
+    def _enqueue(queue: Queue, item: Tuple[Optional[str], Optional[str]]):
+        """放入发送队列，队列已满时丢弃最早的一条消息"""
+        while True:
+            try:
+                queue.put_nowait(item)
+                return
+            except Full:
+                try:
+                    dropped = queue.get_nowait()
+                except Empty:
+                    continue
+                if dropped:
+                    logger.warning("OneBot消息发送队列已满，丢弃最早的消息：%s", dropped[0])
+
+    def _worker_loop(self, queue: Queue, stop_event: threading.Event,
+                     previous: Optional[threading.Thread] = None):
+        """
+        后台发送线程：按顺序逐条发送队列中的消息
+        收到停止信号后继续发送停止前已排队的消息，超过 _DRAIN_TIMEOUT 秒仍未发送的消息将被丢弃
+        """
+        if previous:
+            previous.join()
+        deadline = None
+        while True:
+            if stop_event.is_set():
+                if deadline is None:
+                    deadline = time.monotonic() + _DRAIN_TIMEOUT
+                # 停止后不再有新消息入队，队列为空即已全部发送
+                if queue.empty() or time.monotonic() > deadline:
+                    break
+            item = queue.get()
+            if item is None:
+                break
+            self._send(*item)
+        # 发送超时，丢弃尚未发送的消息
+        discarded = 0
+        while True:
+            try:
+                item = queue.get_nowait()
+            except Empty:
+                break
+            if item:
+                discarded += 1
+        if discarded:
+            logger.warning("OneBot消息插件已停止，%s 秒内未能发送完毕，丢弃 %s 条未发送的消息",
+                           _DRAIN_TIMEOUT, discarded)
+        # 停止时本线程仍在发送，会话由本线程退出后关闭；已重新启动的发送线程会继续使用该会话
+        with self._lock:
+            if self._stop_event is stop_event:
+                self._close_session()
+
+    def _get_session(self) -> Optional[requests.Session]:
+        """获取复用的HTTP会话，避免每条消息都重新建立连接；插件停止后不再创建新会话"""
+        with self._lock:
+            if self._session is None:
+                if self._stop_event and self._stop_event.is_set():
+                    return None
+                session = requests.Session()
+                # 只有一个OneBot服务，连接池无需太大；仅重试建立连接失败的情况，避免消息重复发送
+                adapter = HTTPAdapter(pool_connections=1,
+                                      pool_maxsize=4,
+                                      max_retries=Retry(total=2, connect=2, read=0, status=0,
+                                                        backoff_factor=0.3))
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    def _close_session(self):
+        """关闭HTTP会话，调用方需持有锁"""
+        if self._session:
+            self._session.close()
+            self._session = None
+
+    def _resolve_target(self) -> Tuple[Optional[str], Optional[Dict[str, int]], Optional[str]]:
+        """
+        根据当前配置解析发送目标
+        :return: API接口地址、目标参数、配置错误信息
+        """
+        # 确定发送的API接口
+        if not self._server:
+            return None, None, "服务器地址未配置"
+            
+        if self._message_type == "private":
+            action, id_key, id_name, target_id = "send_private_msg", "user_id", "用户ID", self._user_id
+        else:  # group
+            action, id_key, id_name, target_id = "send_group_msg", "group_id", "群组ID", self._group_id
+        if not target_id:
+            return None, None, f"{id_name}未配置"
+        try:
+            params = {
+                id_key: int(target_id)
+            }
+        except (ValueError, TypeError):
+            return None, None, f"{id_name}格式错误: {target_id}"
+        return f"{self._server.rstrip('/')}/{action}", params, None
+
     def _send(self, title: Optional[str], text: Optional[str]) -> Optional[Tuple[bool, str]]:
         """发送消息"""
         if not self.get_state():
             return False, "插件未启用或参数未配置"
         
         try:
-            # 构建消息内容
+            # 发送目标已在配置加载时解析
+            api_endpoint, target_params, error = self._target
+            if error:
+                return False, error
+            
+            # 目标校验通过后再构建消息内容
             title_str = title or ""
             text_str = text or ""
-            message = f"{title_str}\n\n{text_str}" if title_str else text_str
-            
-            # 确定发送的API接口
-            if not self._server:
-                return False, "服务器地址未配置"
-                
-            if self._message_type == "private":
-                api_endpoint = f"{self._server.rstrip('/')}/send_private_msg"
-                if not self._user_id:
-                    return False, "用户ID未配置"
-                try:
-                    user_id = int(self._user_id)
-                except (ValueError, TypeError):
-                    return False, f"用户ID格式错误: {self._user_id}"
-                    
-                params = {
-                    "user_id": user_id,
-                    "message": message
-                }
-            else:  # group
-                api_endpoint = f"{self._server.rstrip('/')}/send_group_msg"
-                if not self._group_id:
-                    return False, "群组ID未配置"
-                try:
-                    group_id = int(self._group_id)
-                except (ValueError, TypeError):
-                    return False, f"群组ID格式错误: {self._group_id}"
-                    
-                params = {
-                    "group_id": group_id,
-                    "message": message
-                }
-            
-            # 构建请求头
-            headers = {}
-            if self._access_token:
-                headers["Authorization"] = f"Bearer {self._access_token}"
+            params = {
+                **target_params,
+                "message": f"{title_str}\n\n{text_str}" if title_str else text_str
+            }
             
             # 发送请求
-            res = RequestUtils(headers=headers).post_res(
+            # 连接超时3秒，读取超时10秒，OneBot服务不可达时尽快失败
+            res = RequestUtils(headers=self._headers, session=self._get_session(), timeout=(3, 10)).post_res(
                 api_endpoint,
                 json=params
             )
@@ -719,21 +840,21 @@ class OneBotMsg(_PluginBase):
             if res and res.status_code == 200:
                 res_json = res.json()
                 if res_json.get("status") == "ok" and res_json.get("retcode") == 0:
-                    logger.info(f"OneBot消息发送成功: {self._message_type}, 消息内容：{title_str} - {text_str}")
+                    logger.info("OneBot消息发送成功: %s, 消息内容：%s - %s", self._message_type, title_str, text_str)
                     return True, "发送成功"
                 else:
                     error_msg = res_json.get('msg', res_json.get('message', 'unknown error'))
-                    logger.warning(f"OneBot消息发送失败: {error_msg}")
+                    logger.warning("OneBot消息发送失败: %s", error_msg)
                     return False, f"发送失败: {error_msg}"
             elif res is not None:
-                logger.warning(f"OneBot消息发送失败，HTTP错误码：{res.status_code}，错误原因：{res.reason}")
+                logger.warning("OneBot消息发送失败，HTTP错误码：%s，错误原因：%s", res.status_code, res.reason)
                 return False, f"发送失败，HTTP错误码：{res.status_code}，错误原因：{res.reason}"
             else:
                 logger.warning("OneBot消息发送失败：未获取到返回信息")
                 return False, "发送失败：未获取到返回信息"
                 
         except Exception as e:
-            logger.error(f"OneBot消息发送异常: {str(e)}")
+            logger.error("OneBot消息发送异常: %s", e)
             return False, f"发送异常: {str(e)}"
 
     @eventmanager.register(EventType.NoticeMessage)
@@ -745,7 +866,7 @@ class OneBotMsg(_PluginBase):
         msg_body = event.event_data
         # 检查msg_body是否为字典类型
         if not isinstance(msg_body, dict):
-            logger.error(f"消息格式错误: {msg_body}")
+            logger.error("消息格式错误: %s", msg_body)
             return
             
         # 渠道
@@ -756,12 +877,7 @@ class OneBotMsg(_PluginBase):
         # 类型
         msg_type_value = msg_body.get("type")
         # 验证msg_type是否为NotificationType枚举
-        msg_type = None
-        if msg_type_value:
-            for item in NotificationType:
-                if item.name == msg_type_value or item.value == msg_type_value:
-                    msg_type = item
-                    break
+        msg_type = _NOTIFICATION_TYPES.get(msg_type_value) if isinstance(msg_type_value, str) else None
         
         # 标题和文本
         title = msg_body.get("title")
@@ -774,11 +890,36 @@ class OneBotMsg(_PluginBase):
         # 检查消息类型是否在允许列表中
         if (msg_type and self._msgtypes
                 and msg_type.name not in self._msgtypes):
-            logger.info(f"消息类型 {msg_type.value if msg_type else '未知'} 未开启消息发送")
+            logger.info("消息类型 %s 未开启消息发送", msg_type.value)
             return
 
+        # 放入后台队列发送，不阻塞事件处理线程；持锁入队，stop_service清空队列后的消息不会进入旧队列
+        with self._lock:
+            if self._queue is not None:
+                self._enqueue(self._queue, (title, text))
+                return
         return self._send(title, text)
 
     def stop_service(self):
         """退出插件"""
-        pass
\ No newline at end of file
+        with self._lock:
+            worker, queue, stop_event = self._worker, self._queue, self._stop_event
+            self._worker = None
+            self._queue = None
+        if stop_event:
+            # 设置停止信号，发送线程发送完已排队的消息后退出
+            stop_event.set()
+        if worker and worker.is_alive():
+            # 在队尾放入退出信号，唤醒空闲等待的发送线程；队列已满时线程并未阻塞，发送完队列即退出
+            try:
+                queue.put_nowait(None)
+            except Full:
+                pass
+            # 只短暂等待，不阻塞插件重载及程序退出；未发送完的消息由发送线程在后台继续发送
+            worker.join(timeout=1)
+        with self._lock:
+            if worker and worker.is_alive():
+                self._draining_worker = worker
+            # 发送线程未退出时由其退出后自行关闭会话
+            elif self._stop_event is stop_event:
+                self._close_session()
\ No newline at end of file